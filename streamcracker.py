@@ -1,7 +1,7 @@
 import streamlit as st
 import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
+import numpy as np
 
 # ------------------- SETTINGS -------------------
 st.set_page_config(page_title="Steam Cracker Allocation Methods", layout="wide")
@@ -16,156 +16,260 @@ view = st.sidebar.selectbox("Select View:", (
 ))
 
 # ------------------- USER INPUT -------------------
+detail = st.sidebar.radio("Product Detail:", ("Simple (3)", "Detailed (5)"), index=1)
+detailed = detail == "Detailed (5)"
+
 st.sidebar.header("Product Mass Input (in tons)")
 ethylene = st.sidebar.number_input("Ethylene (HVC)", min_value=0.0, value=342.2)
 propylene = st.sidebar.number_input("Propylene (HVC)", min_value=0.0, value=156.7)
-butadiene = st.sidebar.number_input("Butadiene (HVC)", min_value=0.0, value=46.6)
-others = st.sidebar.number_input("Others (HVC)", min_value=0.0, value=202.1)
+# Always rendered (disabled in Simple mode) so toggling the detail level keeps their values
+butadiene = st.sidebar.number_input("Butadiene (HVC)", min_value=0.0, value=46.6, disabled=not detailed)
+others = st.sidebar.number_input("Others (HVC)", min_value=0.0, value=202.1, disabled=not detailed)
 fuel = st.sidebar.number_input("Fuel (non-HVC)", min_value=0.0, value=74.2)
 
 st.sidebar.header("Flow Color Settings")
 color_eth = st.sidebar.color_picker("Ethylene Flow (HVC)", "#FF6B6B")
 color_pro = st.sidebar.color_picker("Propylene Flow (HVC)", "#C44D58")
-color_but = st.sidebar.color_picker("Butadiene Flow (HVC)", "#D46A6A")
-color_oth = st.sidebar.color_picker("Others Flow (HVC)", "#FFA07A")
+color_but = st.sidebar.color_picker("Butadiene Flow (HVC)", "#D46A6A", disabled=not detailed)
+color_oth = st.sidebar.color_picker("Others Flow (HVC)", "#FFA07A", disabled=not detailed)
 color_fuel = st.sidebar.color_picker("Fuel Flow (non-HVC)", "#222222")
-color_feedstock = st.sidebar.color_picker("Feedstock Input", "#FFA500")
-color_energy = st.sidebar.color_picker("Energy Input", "#FFD700")
 
 # ------------------- PRODUCT INFO -------------------
-products = {
-    "Ethylene (HVC)": {"mass": ethylene, "flow_color": color_eth},
-    "Propylene (HVC)": {"mass": propylene, "flow_color": color_pro},
-    "Butadiene (HVC)": {"mass": butadiene, "flow_color": color_but},
-    "Others (HVC)": {"mass": others, "flow_color": color_oth},
-    "Fuel (non-HVC)": {"mass": fuel, "flow_color": color_fuel}
-}
+# One array per field (aligned by product order) instead of a dict per product
+if detailed:
+    names = ("Ethylene (HVC)", "Propylene (HVC)", "Butadiene (HVC)", "Others (HVC)", "Fuel (non-HVC)")
+    mass = np.array([ethylene, propylene, butadiene, others, fuel], dtype=float)
+    flow_colors = (color_eth, color_pro, color_but, color_oth, color_fuel)
+    is_hvc = np.array([True, True, True, True, False])
+else:
+    names = ("Ethylene (HVC)", "Propylene (HVC)", "Fuel (non-HVC)")
+    mass = np.array([ethylene, propylene, fuel], dtype=float)
+    flow_colors = (color_eth, color_pro, color_fuel)
+    is_hvc = np.array([True, True, False])
 
 # Normalize mass
 feedstock_mass = 1000.0
-original_total = sum(p["mass"] for p in products.values())
+original_total = mass.sum()
 scale = feedstock_mass / original_total if original_total > 0 else 0
-for p in products.values():
-    p["mass"] *= scale
+mass = mass * scale
 
 # Emissions
 emission_feedstock = 2.0
 emission_energy = 1.0
 
 # Allocation calculations
-total_mass = sum(p["mass"] for p in products.values())
-total_hvc = sum(p["mass"] for k, p in products.items() if "non-HVC" not in k)
-for k, v in products.items():
-    is_hvc = "non-HVC" not in k
-    if is_hvc:
-        v["feedstock_alloc_hvc"] = emission_feedstock * v["mass"] / total_hvc
-        v["energy_alloc_hvc"] = emission_energy * v["mass"] / total_hvc
-    else:
-        v["feedstock_alloc_hvc"] = emission_feedstock * v["mass"] / total_mass
-        v["energy_alloc_hvc"] = 0.0
-    v["feedstock_alloc_all"] = emission_feedstock * v["mass"] / total_mass
-    v["energy_alloc_all"] = emission_energy * v["mass"] / total_mass
-
-# DataFrames for charts
-df_allocation = pd.DataFrame([
-    {
-        "Product": k,
-        "Mass": v["mass"],
-        "Emission_HVC": v["feedstock_alloc_hvc"] + v["energy_alloc_hvc"],
-        "Emission_All": v["feedstock_alloc_all"] + v["energy_alloc_all"],
-        "Feedstock": v["feedstock_alloc_all"],
-        "Energy": v["energy_alloc_all"],
-        "Error": abs((v["feedstock_alloc_all"] + v["energy_alloc_all"]) - (v["feedstock_alloc_hvc"] + v["energy_alloc_hvc"]))
+@st.cache_data(max_entries=32)
+def compute_allocations(mass, is_hvc, emission_feedstock, emission_energy):
+    total_mass = mass.sum()
+    total_hvc = mass[is_hvc].sum()
+    share_all = mass / total_mass if total_mass > 0 else np.zeros_like(mass)
+    share_hvc = np.where(is_hvc, mass, 0.0) / total_hvc if total_hvc > 0 else np.zeros_like(mass)
+    feedstock_alloc_hvc = emission_feedstock * np.where(is_hvc, share_hvc, share_all)
+    energy_alloc_hvc = emission_energy * share_hvc
+    feedstock_alloc_all = emission_feedstock * share_all
+    energy_alloc_all = emission_energy * share_all
+    return feedstock_alloc_hvc, energy_alloc_hvc, feedstock_alloc_all, energy_alloc_all
+
+
+# Only recompute when the product inputs change; unchanged reruns reuse the session's results
+alloc_key = (names, tuple(mass), emission_feedstock, emission_energy)
+if st.session_state.get("alloc_key") != alloc_key:
+    feedstock_alloc_hvc, energy_alloc_hvc, feedstock_alloc_all, energy_alloc_all = compute_allocations(
+        mass, is_hvc, emission_feedstock, emission_energy)
+
+    allocations = {
+        "hvc": (feedstock_alloc_hvc, energy_alloc_hvc),
+        "all": (feedstock_alloc_all, energy_alloc_all),
     }
-    for k, v in products.items()
-])
+    emission_hvc = feedstock_alloc_hvc + energy_alloc_hvc
+    emission_all = feedstock_alloc_all + energy_alloc_all
+    burdens = emission_all - emission_hvc
 
-# ------------------- VIEWS -------------------
-if view == "Mass Balance":
-    st.header("Mass Balance View")
-    st.markdown("📝 **Note**: Feedstock mass (1000 t) excludes heat integration losses and represents net usable input.")
-    labels = ["Feedstock", "Energy Input", "Steam Cracking"] + list(products.keys())
-    source = [0, 1] + [2]*len(products)
-    target = [2, 2] + list(range(3, 3+len(products)))
-    values = [feedstock_mass, 10] + [v["mass"] for v in products.values()]
-    link_colors = [color_feedstock, color_energy] + [v["flow_color"] for v in products.values()]
-    node_colors = ["#AAAAAA"] * len(labels)
-
-    fig = go.Figure(go.Sankey(
-        node=dict(label=labels, color=node_colors),
-        link=dict(source=source, target=target, value=values, color=link_colors)
-    ))
-    st.plotly_chart(fig, use_container_width=True)
+    # Output table for the mass balance view; the charts read the arrays directly
+    st.session_state["mass_df"] = pd.DataFrame({
+        "Product": list(names),
+        "Mass": mass
+    })
+    st.session_state["alloc"] = (allocations, emission_hvc, emission_all, burdens)
+    st.session_state["alloc_key"] = alloc_key
 
-    st.subheader("Input Table")
-    st.dataframe(pd.DataFrame({
-        "Input": ["Feedstock", "Energy"],
-        "Amount": ["1000 t", "10 GJ"],
-        "CO₂ Emissions": [emission_feedstock, emission_energy]
-    }))
+allocations, emission_hvc, emission_all, burdens = st.session_state["alloc"]
+df_mass = st.session_state["mass_df"]
 
-    st.subheader("Output Table")
-    st.dataframe(df_allocation[["Product", "Mass"]])
-
-elif view in ["Allocation to HVC only", "Allocation to all"]:
-    st.header(f"CO₂ Allocation: {view}")
-    mode = "hvc" if view.endswith("HVC only") else "all"
-    df = pd.DataFrame([
-        {
-            "Product": k,
-            "Mass": v["mass"],
-            "Feedstock": v[f"feedstock_alloc_{mode}"],
-            "Energy": v[f"energy_alloc_{mode}"],
-            "Total Emission": v[f"feedstock_alloc_{mode}"] + v[f"energy_alloc_{mode}"]
-        }
-        for k, v in products.items()
-    ])
-    st.dataframe(df)
-
-    labels = ["Feedstock Emission", "Energy Emission"] + list(products.keys())
+# ------------------- FIGURE BUILDERS -------------------
+# Fixed nodes and links of the Sankeys; product nodes are appended after these
+_MASS_LABELS = ("Feedstock", "Energy Input", "Steam Cracking")
+_MASS_SOURCE = (0, 1)
+_MASS_TARGET = (2, 2)
+_CO2_LABELS = ("Feedstock Emission", "Energy Emission")
+_NODE_COLOR = "#AAAAAA"
+
+
+def hex_to_rgba(hex_str, alpha=0.5):
+    h = hex_str.lstrip("#")
+    r, g, b = int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def draw_sankey(key, labels, links):
+    # Keep one figure per chart in the session and only swap its link arrays on reruns;
+    # rebuild when the product nodes change (Simple/Detailed toggle)
+    fig = st.session_state.get(key)
+    if fig is None or tuple(fig.data[0].node.label) != labels:
+        fig = go.Figure(go.Sankey(
+            node=dict(label=labels, color=(_NODE_COLOR,) * len(labels)),
+            link=links
+        ))
+        st.session_state[key] = fig
+    else:
+        fig.data[0].link.update(links)
+    return fig
+
+
+@st.cache_data(max_entries=32)
+def mass_sankey_links(masses, flow_colors, feedstock_mass, color_feedstock, color_energy):
+    source = list(_MASS_SOURCE)
+    target = list(_MASS_TARGET)
+    value = [feedstock_mass, 10]
+    color = [hex_to_rgba(color_feedstock), hex_to_rgba(color_energy)]
+
+    # Zero-mass products get no link, same as the zero allocations in the CO₂ Sankey
+    for i, (m, c) in enumerate(zip(masses, flow_colors)):
+        if m > 0:
+            source.append(2); target.append(i + 3); value.append(m); color.append(hex_to_rgba(c))
+
+    return dict(source=source, target=target, value=value, color=color)
+
+
+def draw_mass_sankey(names, masses, flow_colors, feedstock_mass, color_feedstock, color_energy):
+    labels = _MASS_LABELS + tuple(names)
+    links = mass_sankey_links(masses, flow_colors, feedstock_mass, color_feedstock, color_energy)
+    return draw_sankey("sankey_mass", labels, links)
+
+
+@st.cache_data(max_entries=32)
+def co2_sankey_links(feedstock_alloc, energy_alloc, flow_colors):
     source = []
     target = []
     value = []
     color = []
 
-    for i, (k, v) in enumerate(products.items()):
+    for i, (f, e, c) in enumerate(zip(feedstock_alloc, energy_alloc, flow_colors)):
         idx = i + 2
-        f = v[f"feedstock_alloc_{mode}"]
-        e = v[f"energy_alloc_{mode}"]
         if f > 0:
-            source.append(0); target.append(idx); value.append(f); color.append(v["flow_color"])
+            source.append(0); target.append(idx); value.append(f); color.append(hex_to_rgba(c))
         if e > 0:
-            source.append(1); target.append(idx); value.append(e); color.append(v["flow_color"])
+            source.append(1); target.append(idx); value.append(e); color.append(hex_to_rgba(c))
 
-    node_colors = ["#AAAAAA"] * len(labels)
-    fig = go.Figure(go.Sankey(
-        node=dict(label=labels, color=node_colors),
-        link=dict(source=source, target=target, value=value, color=color)
-    ))
-    st.plotly_chart(fig, use_container_width=True)
+    return dict(source=source, target=target, value=value, color=color)
+
+
+def draw_co2_sankey(mode, names, feedstock_alloc, energy_alloc, flow_colors):
+    labels = _CO2_LABELS + tuple(names)
+    links = co2_sankey_links(feedstock_alloc, energy_alloc, flow_colors)
+    return draw_sankey(f"sankey_co2_{mode}", labels, links)
 
-# ------------------- OVERVIEW COMPARISON -------------------
-elif view == "Overview Comparison":
-    st.header("Overview Comparison")
-    df_bar = df_allocation.copy()
-    df_bar["Burden"] = df_bar["Emission_All"] - df_bar["Emission_HVC"]  # <-- 수정된 부분
 
+@st.cache_data(max_entries=32)
+def format_table(names, masses, feedstock_alloc, energy_alloc):
+    f = np.asarray(feedstock_alloc)
+    e = np.asarray(energy_alloc)
+    return pd.DataFrame({
+        "Product": list(names),
+        "Mass": np.asarray(masses),
+        "Feedstock": f,
+        "Energy": e,
+        "Total Emission": f + e
+    })
+
+
+def build_overview_fig(names, hvc_emissions, all_emissions, burdens):
     fig = go.Figure()
-    fig.add_trace(go.Bar(x=df_bar["Product"], y=df_bar["Emission_HVC"],
+    fig.add_trace(go.Bar(x=names, y=hvc_emissions,
                          name="Allocation to HVC", marker_color="#FF6B6B"))
-    fig.add_trace(go.Bar(x=df_bar["Product"], y=df_bar["Emission_All"],
+    fig.add_trace(go.Bar(x=names, y=all_emissions,
                          name="Allocation to All", marker_color="#444444"))
 
-    for i, row in df_bar.iterrows():
-        burden = row["Burden"]
-        annotation = "⬆ Gained burden" if burden > 0 else "⬇ Reduced burden"
-        fig.add_annotation(x=row["Product"], y=max(row["Emission_HVC"], row["Emission_All"]),
-                           text=f"{annotation}: {abs(burden):.3f} kg CO₂-eq/kg",
-                           showarrow=False, yshift=20, font=dict(size=12, color="gray"))
+    annotations = [
+        dict(x=name, y=max(hvc, alloc_all),
+             text=f"{'⬆ Gained burden' if burden > 0 else '⬇ Reduced burden'}: {abs(burden):.3f} kg CO₂-eq/kg",
+             showarrow=False, yshift=20, font=dict(size=12, color="gray"))
+        for name, hvc, alloc_all, burden in zip(names, hvc_emissions, all_emissions, burdens)
+    ]
 
-    fig.update_layout(title="Allocation Burden Comparison",
+    fig.update_layout(annotations=annotations,
+                      title="Allocation Burden Comparison",
                       barmode="group",
                       yaxis_title="kg CO₂-eq/kg product",
                       legend_title="Allocation Method")
+    return fig
+
+
+# ------------------- VIEWS -------------------
+masses = tuple(mass)
+
+# Widgets inside a fragment rerun only that view; Streamlit < 1.37 only ships the experimental name
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+
+@fragment
+def render_mass_balance():
+    st.header("Mass Balance View")
+    st.markdown("📝 **Note**: Feedstock mass (1000 t) excludes heat integration losses and represents net usable input.")
+
+    # Input flow colors are only used here, so they live in the fragment instead of the sidebar;
+    # their values are kept in session state because other views don't render these pickers
+    col_feedstock, col_energy = st.columns(2)
+    color_feedstock = col_feedstock.color_picker("Feedstock Input", st.session_state.get("color_feedstock", "#FFA500"))
+    color_energy = col_energy.color_picker("Energy Input", st.session_state.get("color_energy", "#FFD700"))
+    st.session_state["color_feedstock"] = color_feedstock
+    st.session_state["color_energy"] = color_energy
+    fig = draw_mass_sankey(names, masses, flow_colors, feedstock_mass, color_feedstock, color_energy)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Input Table")
+    st.dataframe(pd.DataFrame({
+        "Input": ["Feedstock", "Energy"],
+        "Amount": ["1000 t", "10 GJ"],
+        "CO₂ Emissions": [emission_feedstock, emission_energy]
+    }))
+
+    st.subheader("Output Table")
+    st.dataframe(df_mass)
+
+
+def render_allocation(title, mode):
+    st.header(f"CO₂ Allocation: {title}")
+    feedstock_alloc, energy_alloc = (tuple(a) for a in allocations[mode])
+    st.dataframe(format_table(names, masses, feedstock_alloc, energy_alloc))
+
+    fig = draw_co2_sankey(mode, names, feedstock_alloc, energy_alloc, flow_colors)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@fragment
+def render_hvc_only():
+    render_allocation("Allocation to HVC only", "hvc")
+
+
+@fragment
+def render_all():
+    render_allocation("Allocation to all", "all")
+
+
+# ------------------- OVERVIEW COMPARISON -------------------
+@fragment
+def render_overview():
+    st.header("Overview Comparison")
+    fig = build_overview_fig(names, tuple(emission_hvc), tuple(emission_all), tuple(burdens))
     st.plotly_chart(fig, use_container_width=True)
 
+
+if view == "Mass Balance":
+    render_mass_balance()
+elif view == "Allocation to HVC only":
+    render_hvc_only()
+elif view == "Allocation to all":
+    render_all()
+elif view == "Overview Comparison":
+    render_overview()